@@ -1,11 +1,19 @@
-import os, io, time, json, re, textwrap
+import os, io, time, json, re, textwrap, logging, tempfile, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
 from dotenv import load_dotenv
-import traceback
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Request, Response, render_template, request, jsonify
 from werkzeug.utils import secure_filename
 import requests
 import io, pdfplumber
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable, Iterator
+from metrics import (stage, render_metrics, profile_if_slow, REQUEST_SECONDS,
+                     GEMINI_CALLS, GEMINI_THROTTLED, GEMINI_RETRIES,
+                     GEMINI_GIVEUPS, TOKENS, PAGES, CHUNKS)
+from normalize import MedicineIndex
+from controller import (AdaptiveController, MAX_INFLIGHT, MAX_ATTEMPTS,
+                        is_retryable, backoff_delay)
 
 # ────────────────────────── 1) Config ──────────────────────────
 load_dotenv()
@@ -13,50 +21,153 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     raise RuntimeError("Set GEMINI_API_KEY in env")
 
-MODEL   = "models/gemini-1.5-flash-latest"
-API_URL = (f"https://generativelanguage.googleapis.com/v1beta/"
-           f"{MODEL}:generateContent?key={GEMINI_API_KEY}")
+MODEL    = "models/gemini-1.5-flash-latest"
+API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+API_URL  = f"{API_BASE}/v1beta/{MODEL}:generateContent?key={GEMINI_API_KEY}"
 
-RATE_DELAY      = 1.25     # seconds between calls
-CHUNK_LINES     = 50
+RATE_DELAY      = float(os.getenv("RATE_DELAY", "1.25"))   # initial pacing; adapted at runtime
+HTTP_POOL_SIZE  = 16
+SUBMIT_WINDOW   = 2 * MAX_INFLIGHT   # chunks queued ahead of the slowest one
+CHUNK_LINES     = int(os.getenv("CHUNK_LINES", "50"))
 REQUEST_TIMEOUT = 60
+UPLOAD_DIR      = os.getenv("UPLOAD_DIR") or None   # None → system temp dir
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+log = logging.getLogger("medanalyzer")
+
+class SpooledRequest(Request):
+    """
+    Stream every uploaded file straight into a named temp file on disk
+    (instead of werkzeug's in-memory SpooledTemporaryFile), so the PDF can
+    be handed to pdfplumber by path and never lives in RAM as one bytes
+    object. The file is deleted when the request is closed.
+    """
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        return tempfile.NamedTemporaryFile("wb+", suffix=".upload", dir=UPLOAD_DIR)
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
+app.request_class = SpooledRequest
 app.config["MAX_CONTENT_LENGTH"] = 20 * 1024 * 1024  # 20 MB
 
-# ────────────────────────── 2) Helpers ──────────────────────────
-def extract_text_from_pdf(data: bytes) -> str:
+# ────────────────────────── 2) Shared state ──────────────────────────
+# Everything in this section is built at import time, so a pre-forking
+# server with preload_app (gunicorn.conf.py) builds it once in the master
+# and the workers share the pages copy-on-write.
+
+_FENCE_OPEN   = re.compile(r"^```[\w]*\n?", flags=re.S)
+_FENCE_CLOSE  = re.compile(r"\n?```$", flags=re.S)
+_JSON_BLOCK   = re.compile(r"\{.*\}", flags=re.S)
+_TRAIL_COMMA  = re.compile(r",(\s*[}\]])")
+_REL_SECTION  = re.compile(r"[Rr]elevant[^:\n]*[:\n](.+?)(?:\n\s*[Ii]rrelevant|$)", flags=re.S)
+_IRR_SECTION  = re.compile(r"[Ii]rrelevant[^:\n]*[:\n](.+)$", flags=re.S)
+
+_session: requests.Session | None = None
+_session_pid = 0
 
+def http() -> requests.Session:
     """
-    Returns a single UTF-8 string that contains:
+    Keep-alive connection pool for Gemini calls. Pools are per process:
+    a forked worker gets a fresh Session instead of sockets inherited
+    from its parent.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        s = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=HTTP_POOL_SIZE)
+        s.mount("https://", adapter)
+        s.mount("http://",  adapter)
+        _session, _session_pid = s, os.getpid()
+    return _session
+
+
+class JobTracker:
+    """
+    Counts in-flight /api/analyze jobs (reported by /healthz and logged by
+    gunicorn.conf.py when a worker exits with jobs still running).
+    """
+    def __init__(self):
+        self._lock     = threading.Lock()
+        self._inflight = 0
+
+    def __enter__(self):
+        with self._lock:
+            self._inflight += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self._inflight -= 1
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+jobs = JobTracker()
+
+# One limiter per process, shared by all requests. The Gemini quota is per
+# key, so under gunicorn each worker takes a 1/workers share of it
+# (limiter.share() in gunicorn.conf.py post_fork).
+limiter = AdaptiveController(interval=RATE_DELAY)
+
+# ────────────────────────── 3) Helpers ──────────────────────────
+def iter_pdf_blocks(src) -> Iterator[str]:
+    """
+    Lazily yields, page by page:
       • page body text (as extracted by pdfplumber)
       • every table, rendered as tab-separated rows
-    The blocks appear in natural top-to-bottom order for each page.
+    `src` is a file path or a seekable binary file object. Only one page's
+    text is held at a time; each page's layout cache is released once it
+    has been read.
     """
-    parts: list[str] = []
-
-    with pdfplumber.open(io.BytesIO(data)) as pdf:
+    with pdfplumber.open(src) as pdf:
         for pnum, page in enumerate(pdf.pages, 1):
-            # ── plain text ────────────────────────────────────────────
-            text = page.extract_text() or ""
-            if text.strip():
-                parts.append(text)
-
-            # ── tables (each table → TSV block) ───────────────────────
-            for tidx, table in enumerate(page.extract_tables(), 1):
-                if not table:
-                    continue
-                parts.append(f"\n# Page {pnum} – Table {tidx}")
-                for row in table:
-                    # join cells with TAB; replace None with empty string
-                    parts.append("\t".join(cell or "" for cell in row))
+            parts: list[str] = []
+            with stage("extract_page"):
+                # ── plain text ────────────────────────────────────────
+                text = page.extract_text() or ""
+                if text.strip():
+                    parts.append(text)
+
+                # ── tables (each table → TSV block) ───────────────────
+                for tidx, table in enumerate(page.extract_tables(), 1):
+                    if not table:
+                        continue
+                    parts.append(f"\n# Page {pnum} – Table {tidx}")
+                    for row in table:
+                        # join cells with TAB; replace None with empty string
+                        parts.append("\t".join(cell or "" for cell in row))
+            page.close()
+            PAGES.inc()
+            yield from parts
 
-    return "\n".join(parts)
 
+def extract_text_from_pdf(data: bytes) -> str:
+    """
+    Returns the whole document as a single UTF-8 string (blocks from
+    iter_pdf_blocks joined by newlines).
+    """
+    return "\n".join(iter_pdf_blocks(io.BytesIO(data)))
+
+
+def iter_lines(blocks: Iterable[str]) -> Iterator[str]:
+    """Split text blocks into stripped, non-empty lines."""
+    for block in blocks:
+        for ln in block.splitlines():
+            ln = ln.strip()
+            if ln:
+                yield ln
 
-def chunk_list(lines, n):
-    for i in range(0, len(lines), n):
-        yield "\n".join(lines[i:i+n])
+
+def chunk_list(lines: Iterable[str], n: int) -> Iterator[str]:
+    """Group any iterable of lines into newline-joined blocks of n lines."""
+    it = iter(lines)
+    while batch := list(islice(it, n)):
+        with stage("chunking"):
+            block = "\n".join(batch)
+        yield block
 
 def build_prompt(disease: str, block: str) -> str:
 
@@ -90,11 +201,18 @@ def _strip_fence(text: str) -> str:
     """
     if text.startswith("```"):
         # kill the opening fence (``` or ```
-        text = re.sub(r"^```[\w]*\n?", "", text,  count=1, flags=re.S)
+        text = _FENCE_OPEN.sub("", text, count=1)
         # kill the closing fence (last line ```
-        text = re.sub(r"\n?```$", "", text,  count=1, flags=re.S)
+        text = _FENCE_CLOSE.sub("", text, count=1)
     return text.strip()
 
+def _retry_after(resp) -> float:
+    """Retry-After header in seconds (0 when absent or an HTTP date)."""
+    try:
+        return max(0.0, float(resp.headers.get("Retry-After", 0)))
+    except ValueError:
+        return 0.0
+
 def call_gemini(prompt: str) -> Dict[str, Any]:
     body = {
         "contents": [{"role": "user", "parts": [{"text": prompt}]}],
@@ -102,51 +220,72 @@ def call_gemini(prompt: str) -> Dict[str, Any]:
     }
 
     t0      = time.time()
-    resp    = requests.post(API_URL, json=body,
-                            headers={"Content-Type": "application/json"},
-                            timeout=REQUEST_TIMEOUT)
+    try:
+        with stage("http"):
+            resp    = http().post(API_URL, json=body,
+                                      headers={"Content-Type": "application/json"},
+                                      timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as exc:    # connection reset, timeout …
+        GEMINI_CALLS.labels(status="0").inc()
+        return {
+            "ok": False, "status": 0, "text": str(exc),
+            "usage": {"in": 0, "out": 0}, "elapsed": time.time() - t0
+        }
     elapsed = time.time() - t0
 
-    if not resp.ok:                      # network / HTTP error
+    GEMINI_CALLS.labels(status=str(resp.status_code)).inc()
+    if resp.status_code == 429:
+        GEMINI_THROTTLED.inc()
+
+    if not resp.ok:                      # HTTP error
         return {
             "ok": False, "status": resp.status_code, "text": resp.text,
-            "usage": {"in": 0, "out": 0}, "elapsed": elapsed
+            "usage": {"in": 0, "out": 0}, "elapsed": elapsed,
+            "retry_after": _retry_after(resp),
         }
 
-    data  = resp.json()
-    parts = data.get("candidates", [{}])[0] \
-                .get("content", {})      \
-                .get("parts",   [])
-    
-    print(data)
+    with stage("parse"):
+        try:
+            data  = resp.json()
+            parts = data.get("candidates", [{}])[0] \
+                        .get("content", {})      \
+                        .get("parts",   [])
 
-    combined: Dict[str, List[dict]] = {"relevant": [], "irrelevant": []}
+            log.debug("gemini response: %s", data)
 
-    for part in parts:
-        raw = part.get("text", "").strip()
-        if not raw:
-            continue
+            combined: Dict[str, List[dict]] = {"relevant": [], "irrelevant": []}
 
-        clean = _strip_fence(raw)
+            for part in parts:
+                raw = part.get("text", "").strip()
+                if not raw:
+                    continue
 
-        try:
-            obj = json.loads(clean)
-        except json.JSONDecodeError:
-            continue                    # skip non-JSON fragments
+                clean = _strip_fence(raw)
 
-        combined["relevant"].extend(obj.get("relevant",   []))
-        combined["irrelevant"].extend(obj.get("irrelevant", []))
+                try:
+                    obj = json.loads(clean)
+                except json.JSONDecodeError:
+                    continue            # skip non-JSON fragments
+
+                combined["relevant"].extend(obj.get("relevant",   []))
+                combined["irrelevant"].extend(obj.get("irrelevant", []))
+
+            usage = {
+                "in":  data.get("usageMetadata", {}).get("promptTokenCount",      0),
+                "out": data.get("usageMetadata", {}).get("candidatesTokenCount",  0),
+            }
+        except (ValueError, IndexError, AttributeError, TypeError) as exc:
+            # 200 with a body we cannot read (no candidates, not JSON, …):
+            # a failed chunk, but not a reason to back off or retry
+            log.warning("unparseable gemini reply: %r", exc)
+            return {
+                "ok": False, "status": resp.status_code,
+                "text": f"unparseable reply: {exc!r}",
+                "usage": {"in": 0, "out": 0}, "elapsed": elapsed,
+            }
+    TOKENS.labels(direction="in").inc(usage["in"])
+    TOKENS.labels(direction="out").inc(usage["out"])
 
-    usage = {
-        "in":  data.get("usageMetadata", {}).get("promptTokenCount",      0),
-        "out": data.get("usageMetadata", {}).get("candidatesTokenCount",  0),
-    }
-    
-    print({
-        "ok": True, "status": 200,
-        "json": combined, "usage": usage, "elapsed": elapsed
-    })
-    
     return {
         "ok": True, "status": 200,
         "json": combined, "usage": usage, "elapsed": elapsed
@@ -154,6 +293,40 @@ def call_gemini(prompt: str) -> Dict[str, Any]:
 
 
 
+def classify_chunk(prompt: str) -> Dict[str, Any]:
+    """
+    call_gemini() under the process-wide limiter. Retryable failures
+    (429, 5xx, network) are re-queued with jittered exponential backoff
+    up to MAX_ATTEMPTS; the last result is returned either way, with the
+    number of attempts it took.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        limiter.acquire()
+        t0 = time.time()
+        r  = {"ok": False, "status": 0, "text": "", "elapsed": 0.0}
+        try:
+            r = call_gemini(prompt)
+        except Exception as exc:            # never leak a limiter slot
+            log.exception("gemini call failed")
+            r = {"ok": False, "status": 0, "text": repr(exc),
+                 "usage": {"in": 0, "out": 0}, "elapsed": time.time() - t0}
+        finally:
+            limiter.release(r["status"], r["elapsed"], r.get("retry_after", 0.0))
+
+        if r["ok"] or not is_retryable(r["status"]):
+            break
+        if attempt == MAX_ATTEMPTS:
+            GEMINI_GIVEUPS.inc()
+            break
+        GEMINI_RETRIES.inc()
+        delay = backoff_delay(attempt, r.get("retry_after", 0.0))
+        log.debug("retrying chunk (status %s) in %.2fs", r["status"], delay)
+        time.sleep(delay)
+
+    r["attempts"] = attempt
+    return r
+
+
 # ---------- ensure each entry is an object {name,explanation} ----------
 def _normalize_list(lst):
     norm = []
@@ -176,12 +349,12 @@ def safe_parse(reply: str) -> dict[str, list[dict]]:
     trailing commas, or extra keys.
     """
     # 1) isolate the first {...} block (ignores ```json fences etc.)
-    m = re.search(r"\{.*\}", reply, flags=re.S)
+    m = _JSON_BLOCK.search(reply)
     if m:
         raw = m.group(0)
 
         # 2) strip trailing commas that break json.loads
-        raw = re.sub(r",(\s*[}\]])", r"\1", raw)
+        raw = _TRAIL_COMMA.sub(r"\1", raw)
 
         try:
             data = json.loads(raw)
@@ -194,11 +367,10 @@ def safe_parse(reply: str) -> dict[str, list[dict]]:
 
     # 3) fallback: split “Relevant: … / Irrelevant: …” sections
     rel = irr = []
-    m = re.search(r"[Rr]elevant[^:\n]*[:\n](.+?)(?:\n\s*[Ii]rrelevant|$)",
-                  reply, flags=re.S)
+    m = _REL_SECTION.search(reply)
     if m:
         rel = [ln.strip(" -*•\t") for ln in m.group(1).splitlines() if ln.strip()]
-    m = re.search(r"[Ii]rrelevant[^:\n]*[:\n](.+)$", reply, flags=re.S)
+    m = _IRR_SECTION.search(reply)
     if m:
         irr = [ln.strip(" -*•\t") for ln in m.group(1).splitlines() if ln.strip()]
 
@@ -207,48 +379,74 @@ def safe_parse(reply: str) -> dict[str, list[dict]]:
         "irrelevant": _normalize_list(irr),
     }
 
-# ────────────────────────── 3) Routes ──────────────────────────
+# ────────────────────────── 4) Routes ──────────────────────────
 @app.route("/")
 def index():
     return render_template("index.html")
 
+@app.route("/healthz")
+def healthz():
+    return jsonify(status="ok", inflight=jobs.inflight)
+
+@app.route("/metrics")
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
 @app.route("/api/analyze", methods=["POST"])
 def api_analyze():
+    with jobs, REQUEST_SECONDS.time(), \
+         profile_if_slow(request.path, threads=_chunk_prefix()):
+        return _analyze()
+
+def _chunk_prefix() -> str:
+    """Name prefix of this request's chunk threads (one pool per request)."""
+    return f"chunk-{threading.get_ident()}"
+
+def _analyze():
     try:
         # ── 1. validate form ---------------------------------------------------
-        disease = (request.form.get("disease") or "").strip()
-        pdf_file = request.files.get("pdf")
+        # The first touch of request.form/files parses the whole multipart
+        # body (and spools the PDF to disk), so that is what gets timed.
+        with stage("upload_read"):
+            form, files = request.form, request.files
+        disease  = (form.get("disease") or "").strip()
+        pdf_file = files.get("pdf")
 
         if not disease or not pdf_file:
             return jsonify(error="Missing disease or PDF"), 400
 
-        data = pdf_file.read()
-        if not data:
+        stream = pdf_file.stream
+        if stream.seek(0, os.SEEK_END) == 0:
             return jsonify(error="Empty file"), 400
+        stream.seek(0)
 
-        # ── 2. extract text & build chunks ------------------------------------
-        text = extract_text_from_pdf(data)
-        if not text.strip():
-            return jsonify(error="No extractable text"), 200
+        # ── 2. extract text & build chunks (lazily) ---------------------------
+        path   = getattr(stream, "name", None)
+        src    = path if isinstance(path, str) and os.path.isfile(path) else stream
+        chunks = chunk_list(iter_lines(iter_pdf_blocks(src)), CHUNK_LINES)
 
-        lines   = [ln.strip() for ln in text.splitlines() if ln.strip()]
-        chunks  = list(chunk_list(lines, CHUNK_LINES))
-        if not chunks:
-            return jsonify(error="No chunks"), 200
+        first = next(chunks, None)
+        if first is None:
+            return jsonify(error="No extractable text"), 200
+        chunks = chain([first], chunks)
 
         # ── 3. init accumulators ---------------------------------------------
-        agg_rel, agg_irr = {}, {}
+        index            = MedicineIndex()
         results          = []
-        tot_in = tot_out = 0
+        tot_in = tot_out = n_chunks = retries = 0
+        failed: list[int] = []
 
-        # ── 4. loop over chunks ----------------------------------------------
-        for idx, block in enumerate(chunks, 1):
-            r = call_gemini(build_prompt(disease, block))
-            print("chunk", idx, "→", r)      # debug
+        # ── 4. collect one chunk result (always in chunk order) -------------
+        def collect(idx: int, r: Dict[str, Any]) -> None:
+            nonlocal tot_in, tot_out, retries
+            log.debug("chunk %d → %s", idx, r)
+            retries += r["attempts"] - 1
 
             if not r["ok"]:
+                failed.append(idx)
                 results.append({"idx": idx, **r})  # capture error details
-                continue
+                return
 
             # Prefer structured JSON; fall back to safe_parse() if missing
             parsed_raw = r.get("json") or safe_parse(r.get("text", ""))
@@ -258,13 +456,14 @@ def api_analyze():
             irrelevant = _normalize_list(parsed_raw.get("irrelevant", []))
 
             if not relevant and not irrelevant:
-                continue  # nothing useful in this chunk
+                return  # nothing useful in this chunk
 
-            # ── 4a. aggregate uniques ---------------------------------------
-            for obj in relevant:
-                agg_rel.setdefault(obj["name"], obj)
-            for obj in irrelevant:
-                agg_irr.setdefault(obj["name"], obj)
+            # ── 4a. merge on canonical names ---------------------------------
+            with stage("aggregate"):
+                for obj in relevant:
+                    index.add("relevant", obj)
+                for obj in irrelevant:
+                    index.add("irrelevant", obj)
 
             # ── 4b. store per-chunk result -----------------------------------
             results.append({
@@ -274,30 +473,53 @@ def api_analyze():
                 "relevant":    relevant,
                 "irrelevant":  irrelevant,
                 "status":      r["status"],
+                "attempts":    r["attempts"],
             })
 
             tot_in  += r["usage"]["in"]
             tot_out += r["usage"]["out"]
-            time.sleep(RATE_DELAY)
 
-        # ── 5. final JSON response -------------------------------------------
+        # ── 5. fan chunks out under the adaptive limiter ---------------------
+        # Extraction keeps running here while earlier chunks are in flight;
+        # at most SUBMIT_WINDOW chunks are queued ahead of the oldest one.
+        window: deque = deque()
+        with ThreadPoolExecutor(MAX_INFLIGHT, thread_name_prefix=_chunk_prefix()) as pool:
+            for idx, block in enumerate(chunks, 1):
+                n_chunks = idx
+                CHUNKS.inc()
+                with stage("prompt_build"):
+                    prompt = build_prompt(disease, block)
+                window.append((idx, pool.submit(classify_chunk, prompt)))
+                if len(window) >= SUBMIT_WINDOW:
+                    idx0, fut = window.popleft()
+                    collect(idx0, fut.result())
+            while window:
+                idx0, fut = window.popleft()
+                collect(idx0, fut.result())
+
+        # ── 6. final JSON response -------------------------------------------
+        merged = index.split()
         return jsonify(
-            relevant   = sorted(agg_rel.values(), key=lambda d: d["name"].lower()),
-            irrelevant = sorted(agg_irr.values(), key=lambda d: d["name"].lower()),
+            relevant   = merged["relevant"],
+            irrelevant = merged["irrelevant"],
             results    = results,
             summary    = {
-                "calls":      len(chunks),
+                "calls":      n_chunks,
                 "tokens_in":  tot_in,
                 "tokens_out": tot_out,
+                "retries":    retries,
+                "failed":     failed,
+                "controller": limiter.snapshot(),
             },
         )
 
     except Exception as exc:
-        traceback.print_exc()
+        log.exception("analyze failed")
         return jsonify(error=str(exc)), 500
 
 
 
 # ────────────────────────── Main ──────────────────────────
+# Development server only; production runs `gunicorn -c gunicorn.conf.py app:app`
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    app.run(host="0.0.0.0", port=5000, debug=os.getenv("FLASK_DEBUG") == "1")
@@ -0,0 +1,176 @@
+"""
+Peak memory of the PDF → chunks pipeline, per request.
+
+Each (pdf, mode) pair runs in a fresh interpreter so ru_maxrss is not
+polluted by earlier runs:
+
+  buffered  – the pre-streaming pipeline, reproduced inline: upload read
+              into bytes, pdfplumber over io.BytesIO with no per-page
+              cache release, whole text string, full `lines` list and
+              full `chunks` list
+  streaming – the current path: PDF opened by path, pages → lines → chunks
+              consumed one chunk at a time
+
+Besides the bundled sample PDFs a synthetic multi-page prescription list
+(--pages, default 200) is generated so the effect of page count shows.
+
+Usage:
+    python bench_memory.py                      # samples + 200-page PDF
+    python bench_memory.py --pages 500
+    python bench_memory.py big.pdf other.pdf --json out.json
+"""
+import io, os, sys, json, argparse, resource, subprocess, tempfile, tracemalloc
+
+HERE         = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PDFS = [os.path.join(HERE, "invoice_2001321.pdf"),
+                os.path.join(HERE, "sample_pet_prescription.pdf")]
+MODES        = ("buffered", "streaming")
+
+
+def synthetic_pdf(path: str, pages: int, lines_per_page: int = 45) -> str:
+    """
+    Write a minimal text-only PDF: `pages` pages of medicine/dose lines in
+    Helvetica. No third-party writer needed.
+    """
+    drugs = ["Metformin 500mg", "Amlodipine 5mg", "Atorvastatin 20mg",
+             "Lisinopril 10mg", "Omeprazole 20mg", "Gabapentin 300mg",
+             "Sertraline 50mg", "Levothyroxine 75mcg", "Losartan 50mg"]
+    objs  = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+             "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids  = []
+    for p in range(pages):
+        text = ["BT /F1 10 Tf 40 800 Td 14 TL"]
+        for i in range(lines_per_page):
+            d = drugs[(p * lines_per_page + i) % len(drugs)]
+            text.append(f"({p + 1}.{i + 1}  {d}  take once daily with food) '")
+        text.append("ET")
+        stream = "\n".join(text)
+        objs.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objs.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                    f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objs)} 0 R >>")
+        kids.append(f"{len(objs)} 0 R")
+    objs[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+
+    out, offsets = io.BytesIO(), []
+    out.write(b"%PDF-1.4\n")
+    for n, body in enumerate(objs, 1):
+        offsets.append(out.tell())
+        out.write(f"{n} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode())
+    for off in offsets:
+        out.write(f"{off:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\n"
+              f"startxref\n{xref}\n%%EOF\n".encode())
+    with open(path, "wb") as fh:
+        fh.write(out.getvalue())
+    return path
+
+
+def _buffered_text(data: bytes) -> str:
+    """extract_text_from_pdf as it was before streaming (baseline)."""
+    import pdfplumber
+    parts: list[str] = []
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        for pnum, page in enumerate(pdf.pages, 1):
+            text = page.extract_text() or ""
+            if text.strip():
+                parts.append(text)
+            for tidx, table in enumerate(page.extract_tables(), 1):
+                if not table:
+                    continue
+                parts.append(f"\n# Page {pnum} – Table {tidx}")
+                for row in table:
+                    parts.append("\t".join(cell or "" for cell in row))
+    return "\n".join(parts)
+
+
+def _maxrss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss   # macOS reports bytes
+
+
+def _run_one(pdf: str, mode: str) -> dict:
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    sys.path.insert(0, HERE)
+    import app
+
+    base_rss = _maxrss_kb()
+    tracemalloc.start()
+
+    if mode == "buffered":
+        with open(pdf, "rb") as fh:
+            data = fh.read()
+        text   = _buffered_text(data)
+        lines  = [ln.strip() for ln in text.splitlines() if ln.strip()]
+        chunks = ["\n".join(lines[i:i + app.CHUNK_LINES])
+                  for i in range(0, len(lines), app.CHUNK_LINES)]
+        n_chunks = len(chunks)
+    else:
+        n_chunks = 0
+        for _ in app.chunk_list(app.iter_lines(app.iter_pdf_blocks(pdf)),
+                                app.CHUNK_LINES):
+            n_chunks += 1
+
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "pdf":            os.path.basename(pdf),
+        "mode":           mode,
+        "size_kb":        os.path.getsize(pdf) // 1024,
+        "chunks":         n_chunks,
+        "py_heap_peak_kb": py_peak // 1024,
+        "rss_peak_kb":    _maxrss_kb(),
+        "rss_growth_kb":  _maxrss_kb() - base_rss,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("pdfs", nargs="*")
+    ap.add_argument("--pages", type=int, default=200,
+                    help="pages of the synthetic PDF added when no PDFs are given "
+                         "(0 = none)")
+    ap.add_argument("--json", help="also write the results to this file")
+    ap.add_argument("--_child", nargs=2, metavar=("PDF", "MODE"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args._child:
+        print(json.dumps(_run_one(*args._child)))
+        return
+
+    pdfs, tmpdir = list(args.pdfs), None
+    if not pdfs:
+        pdfs = list(DEFAULT_PDFS)
+        if args.pages:
+            tmpdir = tempfile.mkdtemp(prefix="bench-mem-")
+            pdfs.append(synthetic_pdf(os.path.join(tmpdir, f"synthetic_{args.pages}p.pdf"),
+                                      args.pages))
+
+    rows = []
+    for pdf in pdfs:
+        for mode in MODES:
+            out = subprocess.run([sys.executable, __file__, "--_child", pdf, mode],
+                                 check=True, capture_output=True, text=True).stdout
+            rows.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{'pdf':32} {'mode':10} {'chunks':>6} {'py peak KB':>11} "
+          f"{'RSS peak KB':>12} {'RSS +KB':>8}")
+    for r in rows:
+        print(f"{r['pdf'][:32]:32} {r['mode']:10} {r['chunks']:>6} "
+              f"{r['py_heap_peak_kb']:>11} {r['rss_peak_kb']:>12} {r['rss_growth_kb']:>8}")
+
+    if tmpdir:
+        for name in os.listdir(tmpdir):
+            os.remove(os.path.join(tmpdir, name))
+        os.rmdir(tmpdir)
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(rows, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import os, time, random, threading
+from metrics import CONCURRENCY_LIMIT, PACING_INTERVAL
+
+# ────────────────────────── 1) Tunables ──────────────────────────
+MIN_INFLIGHT   = 1
+MAX_INFLIGHT   = int(os.getenv("MAX_INFLIGHT", "8"))
+START_INFLIGHT = float(os.getenv("START_INFLIGHT", "2"))
+MAX_INTERVAL   = 30.0       # seconds; pacing ceiling under heavy throttling
+INTERVAL_STEP  = 0.25       # first non-zero pacing after a clean start
+PACING_STEP    = 0.5        # calls/s added to the paced rate per clean window
+MIN_INTERVAL   = 0.01       # pacing below this (> 100 calls/s) is dropped
+DECREASE       = 0.5        # multiplicative decrease on 429 / 5xx
+LATENCY_SLACK  = 2.0        # latency > SLACK × baseline → shrink gently
+SLOW_DECREASE  = 0.9        # multiplicative decrease on a latency spike
+EWMA_ALPHA     = 0.2
+BASELINE_ALPHA = 0.01       # how fast the baseline drifts up towards the EWMA
+
+MAX_ATTEMPTS   = int(os.getenv("MAX_ATTEMPTS", "5"))
+BACKOFF_BASE   = 1.0        # seconds
+BACKOFF_CAP    = 30.0
+
+
+def is_retryable(status: int) -> bool:
+    """Network errors (status 0), timeouts, throttling and server errors."""
+    return status in (0, 408, 429) or status >= 500
+
+
+def backoff_delay(attempt: int, retry_after: float = 0.0) -> float:
+    """Full-jitter exponential backoff, never shorter than Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)))
+    return max(delay, retry_after)
+
+
+# ────────────────────────── 2) AIMD controller ──────────────────────────
+class AdaptiveController:
+    """
+    AIMD limiter for Gemini calls, shared by every request in the process.
+
+    Two knobs are adjusted from observed outcomes:
+      limit    – how many calls may be in flight at once
+      interval – minimum spacing between call starts (pacing)
+
+    • 2xx with normal latency     → limit += 1/limit (≈ +1 per window)
+    • 2xx above LATENCY_SLACK × baseline
+                                  → limit ×SLOW_DECREASE
+    • any 2xx                     → paced rate (1/interval) += PACING_STEP/limit
+                                    (≈ one step per window, additive)
+    • 429 / 5xx / network error   → limit ×DECREASE, interval doubles;
+                                    Retry-After pushes the next start out
+    • other 4xx                   → counted, no change (not load related)
+
+    Each kind of decrease happens at most once per observed latency, so
+    one burst of failures or slow replies counts once. The two kinds keep
+    separate clocks: a latency trim never stops a 429 from halving the
+    limit, while a halving skips the trim of that window. The baseline follows
+    the fastest recent call: it drops to any faster reply and otherwise
+    drifts up towards the EWMA, so a lasting shift in service latency
+    stops counting as congestion instead of holding the limit forever.
+    """
+
+    def __init__(self, start=START_INFLIGHT, min_limit=MIN_INFLIGHT,
+                 max_limit=MAX_INFLIGHT, interval=0.0):
+        self._cond      = threading.Condition()
+        self.min_limit  = min_limit
+        self.max_limit  = max_limit
+        self.limit      = float(max(min_limit, min(start, max_limit)))
+        self.interval   = interval
+        self.inflight   = 0
+        self._next_slot = 0.0
+        self._cut_at    = {"throttle": 0.0, "latency": 0.0}
+        self.ewma_latency = 0.0
+        self.base_latency = 0.0
+        self.stats = dict.fromkeys(("ok", "throttled", "server_errors",
+                                    "network_errors", "client_errors",
+                                    "decreases", "latency_decreases"), 0)
+        self._publish()
+
+    def share(self, workers: int) -> None:
+        """
+        Take a 1/workers share of the budget when `workers` processes call
+        Gemini with the same key: limits are divided (never below
+        min_limit) and the pacing interval multiplied, so the processes
+        together start at the configured totals.
+        """
+        with self._cond:
+            self.max_limit = max(self.min_limit, self.max_limit // workers)
+            self.limit     = max(self.min_limit, min(self.limit / workers, self.max_limit))
+            self.interval *= workers
+            self._publish()
+
+    # -- admission ---------------------------------------------------------
+    def acquire(self) -> None:
+        """Block until a call may start, then account it as in flight."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+            now   = time.monotonic()
+            start = max(now, self._next_slot)
+            self._next_slot = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, status: int, latency: float, retry_after: float = 0.0) -> None:
+        """Record the outcome of a call started with acquire()."""
+        with self._cond:
+            self.inflight -= 1
+            now = time.monotonic()
+            if is_retryable(status):
+                key = ("throttled" if status == 429 else
+                       "network_errors" if status == 0 else "server_errors")
+                self.stats[key] += 1
+                self._decrease(now, retry_after)
+            elif 200 <= status < 300:
+                self.stats["ok"] += 1
+                self._increase(now, latency)
+            else:
+                self.stats["client_errors"] += 1
+            self._publish()
+            self._cond.notify_all()
+
+    # -- AIMD rules (caller holds the lock) ---------------------------------
+    def _increase(self, now: float, latency: float) -> None:
+        if self.ewma_latency:
+            self.ewma_latency += EWMA_ALPHA * (latency - self.ewma_latency)
+        else:
+            self.ewma_latency = latency
+        if not self.base_latency or latency < self.base_latency:
+            self.base_latency = latency
+        else:
+            self.base_latency += BASELINE_ALPHA * (self.ewma_latency - self.base_latency)
+
+        if self.interval:
+            rate = 1 / self.interval + PACING_STEP / self.limit
+            self.interval = 1 / rate if 1 / rate > MIN_INTERVAL else 0.0
+        if latency > LATENCY_SLACK * self.base_latency:
+            if self._may_cut(now, "latency"):
+                self.stats["latency_decreases"] += 1
+                self.limit = max(self.min_limit, self.limit * SLOW_DECREASE)
+            return
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def _may_cut(self, now: float, kind: str) -> bool:
+        """At most one decrease of `kind` per observed latency."""
+        if now - self._cut_at[kind] < max(self.ewma_latency, 0.1):
+            return False
+        self._cut_at[kind] = now
+        return True
+
+    def _decrease(self, now: float, retry_after: float) -> None:
+        if retry_after:
+            self._next_slot = max(self._next_slot, now + retry_after)
+        if not self._may_cut(now, "throttle"):
+            return
+        self._cut_at["latency"] = now
+        self.stats["decreases"] += 1
+        self.limit    = max(self.min_limit, self.limit * DECREASE)
+        self.interval = min(MAX_INTERVAL, max(self.interval * 2, INTERVAL_STEP))
+
+    def _publish(self) -> None:
+        CONCURRENCY_LIMIT.set(self.limit)
+        PACING_INTERVAL.set(self.interval)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "limit":        round(self.limit, 2),
+                "inflight":     self.inflight,
+                "interval":     round(self.interval, 3),
+                "ewma_latency": round(self.ewma_latency, 3),
+                "base_latency": round(self.base_latency, 3),
+                **self.stats,
+            }
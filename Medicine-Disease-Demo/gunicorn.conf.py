@@ -0,0 +1,67 @@
+"""
+Production server config:  gunicorn -c gunicorn.conf.py app:app
+
+• preload_app – app.py (drug dictionary, SymSpell index, compiled regexes,
+  metric families) is imported once in the master and shared with the
+  workers copy-on-write; gc.freeze() keeps the collector from touching
+  those pages after fork.
+• gthread workers – each /api/analyze job is long and I/O bound, so every
+  worker runs a small thread pool.
+• one Gemini budget – every worker has its own AdaptiveController, so
+  post_fork gives each one a 1/workers share of MAX_INFLIGHT,
+  START_INFLIGHT and the RATE_DELAY rate (one API key for the server).
+• graceful shutdown – on SIGTERM a worker closes its listeners (new
+  connections are refused, so /healthz stops answering) and gunicorn
+  gives in-flight analyze jobs GRACEFUL_TIMEOUT seconds to finish
+  before the worker is killed.
+
+Everything can be overridden with the env vars below or gunicorn flags.
+"""
+import os, gc, glob, tempfile, multiprocessing
+
+bind             = os.getenv("BIND", "0.0.0.0:5000")
+workers          = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class     = "gthread"
+threads          = int(os.getenv("WORKER_THREADS", "4"))
+preload_app      = True
+timeout          = int(os.getenv("WORKER_TIMEOUT", "600"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "300"))
+keepalive        = 5
+max_requests        = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+accesslog        = "-"
+loglevel         = os.getenv("LOG_LEVEL", "info").lower()
+
+# Per-worker metric files are merged by /metrics (metrics.render_metrics).
+# Must be set before app.py – and with it prometheus_client – is imported.
+if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="medanalyzer-prom-")
+else:
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+    for stale in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+        os.remove(stale)
+
+
+def when_ready(server):
+    # Everything preloaded so far is long-lived; move it out of the GC's
+    # generations so collections in workers don't dirty shared pages.
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app as app_module
+    app_module.limiter.share(server.cfg.workers)
+
+
+def worker_exit(server, worker):
+    import app as app_module
+    jobs = app_module.jobs
+    if jobs.inflight:
+        server.log.warning("worker %s exiting with %d analyze job(s) still running",
+                           worker.pid, jobs.inflight)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,161 @@
+"""
+Load test: requests/sec and latency of /api/analyze as gunicorn workers grow.
+
+For each worker count a fresh `gunicorn -c gunicorn.conf.py app:app` is
+started against mock_gemini.py (no quota used), hammered with concurrent
+uploads of a sample PDF, and stopped with SIGTERM.
+
+With --max-rps / --throttle-rate / --error-rate the mock injects 429s and
+503s; the report then also shows how many chunk retries the adaptive
+limiter needed and how many chunks were lost (should stay 0).
+
+Usage:
+    python loadtest.py --workers 1,2,4 --requests 200 --concurrency 16
+    python loadtest.py --latency-ms 800 --pdf big.pdf --json load.json
+    python loadtest.py --workers 2 --max-rps 10 --throttle-rate 0.05 --chunk-lines 5
+"""
+import os, sys, json, time, signal, socket, argparse, subprocess
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import mock_gemini
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pct(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+def _start_server(workers: int, threads: int, mock_port: int, rate_delay: float,
+                  chunk_lines: int = 50):
+    port = _free_port()
+    env  = dict(os.environ,
+                GEMINI_API_KEY="mock",
+                GEMINI_API_BASE=f"http://127.0.0.1:{mock_port}",
+                RATE_DELAY=str(rate_delay),
+                CHUNK_LINES=str(chunk_lines),
+                LOG_LEVEL="warning")
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+         "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+         "--threads", str(threads), "--access-logfile", "/dev/null", "app:app"],
+        cwd=HERE, env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            if requests.get(base + "/healthz", timeout=1).ok:
+                return proc, base
+        except requests.ConnectionError:
+            pass
+        if proc.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("gunicorn did not become ready")
+
+
+def _stop_server(proc):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def run_level(workers: int, args, mock_port: int, pdf_bytes: bytes) -> dict:
+    proc, base = _start_server(workers, args.threads, mock_port, args.rate_delay,
+                               args.chunk_lines)
+    url = base + "/api/analyze"
+
+    def one(_):
+        t0 = time.perf_counter()
+        r  = requests.post(url, data={"disease": "hypertension"},
+                           files={"pdf": ("load.pdf", pdf_bytes, "application/pdf")},
+                           timeout=600)
+        summary = r.json().get("summary", {}) if r.ok else {}
+        return time.perf_counter() - t0, r.status_code, summary
+
+    try:
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(one, range(min(args.concurrency, args.requests))))  # warm-up
+            t0  = time.perf_counter()
+            out = list(pool.map(one, range(args.requests)))
+            wall = time.perf_counter() - t0
+    finally:
+        _stop_server(proc)
+
+    lat  = sorted(d * 1000 for d, _, _ in out)
+    errs = sum(1 for _, st, _ in out if st != 200)
+    last = max(out, key=lambda o: o[2].get("controller", {}).get("ok", 0))[2]
+    return {
+        "workers":     workers,
+        "threads":     args.threads,
+        "requests":    len(out),
+        "errors":      errs,
+        "chunks":      sum(s.get("calls", 0) for _, _, s in out),
+        "retries":     sum(s.get("retries", 0) for _, _, s in out),
+        "lost_chunks": sum(len(s.get("failed", [])) for _, _, s in out),
+        "controller":  last.get("controller"),
+        "rps":         len(out) / wall,
+        "latency_ms":  {"p50": _pct(lat, .50), "p95": _pct(lat, .95),
+                        "p99": _pct(lat, .99), "max": lat[-1]},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    ap.add_argument("--threads", type=int, default=4, help="threads per worker")
+    ap.add_argument("--requests", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--latency-ms", type=float, default=300, help="mock LLM latency")
+    ap.add_argument("--jitter-ms", type=float, default=50)
+    ap.add_argument("--rate-delay", type=float, default=0.0,
+                    help="RATE_DELAY passed to the app (seconds)")
+    ap.add_argument("--chunk-lines", type=int, default=50,
+                    help="CHUNK_LINES passed to the app (smaller → more calls)")
+    ap.add_argument("--max-rps", type=float, default=0, help="mock quota, 0 = unlimited")
+    ap.add_argument("--throttle-rate", type=float, default=0, help="random 429 fraction")
+    ap.add_argument("--error-rate", type=float, default=0, help="random 503 fraction")
+    ap.add_argument("--pdf", default=os.path.join(HERE, "sample_pet_prescription.pdf"))
+    ap.add_argument("--json", help="also write the results to this file")
+    args = ap.parse_args()
+
+    with open(args.pdf, "rb") as fh:
+        pdf_bytes = fh.read()
+    mock = mock_gemini.serve(0, args.latency_ms, args.jitter_ms,
+                             args.max_rps, args.throttle_rate, args.error_rate)
+
+    rows = []
+    print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>6} {'chunks':>7} {'retries':>7} {'lost':>5}")
+    for w in [int(x) for x in args.workers.split(",") if x.strip()]:
+        r = run_level(w, args, mock.server_port, pdf_bytes)
+        rows.append(r)
+        lat = r["latency_ms"]
+        print(f"{w:>7} {r['rps']:>8.2f} {lat['p50']:>8.0f} {lat['p95']:>8.0f} "
+              f"{lat['p99']:>8.0f} {r['errors']:>6} {r['chunks']:>7} "
+              f"{r['retries']:>7} {r['lost_chunks']:>5}")
+        if r["controller"]:
+            print(f"        controller: {r['controller']}")
+
+    print(f"mock responses by status: {mock.RequestHandlerClass.counts}")
+    mock.shutdown()
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"config": vars(args), "results": rows}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
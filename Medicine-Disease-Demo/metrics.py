@@ -0,0 +1,153 @@
+import os, sys, time, logging, threading
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from prometheus_client import (
+    REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess, CONTENT_TYPE_LATEST,
+)
+
+log = logging.getLogger("medanalyzer")
+
+# ────────────────────────── 1) Metric families ──────────────────────────
+_STAGE_BUCKETS = (.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "medanalyzer_stage_seconds",
+    "Wall time spent in each pipeline stage",
+    ["stage"], buckets=_STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "medanalyzer_request_seconds",
+    "End-to-end wall time of /api/analyze",
+    buckets=(.1, .5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+GEMINI_CALLS = Counter(
+    "medanalyzer_gemini_calls_total",
+    "Gemini generateContent calls by HTTP status",
+    ["status"],
+)
+GEMINI_THROTTLED = Counter(
+    "medanalyzer_gemini_throttled_total",
+    "Gemini calls rejected with HTTP 429",
+)
+GEMINI_RETRIES = Counter(
+    "medanalyzer_gemini_retries_total",
+    "Chunk calls re-queued after a retryable failure",
+)
+GEMINI_GIVEUPS = Counter(
+    "medanalyzer_gemini_giveups_total",
+    "Chunks that still failed after the last retry",
+)
+CONCURRENCY_LIMIT = Gauge(
+    "medanalyzer_concurrency_limit",
+    "Current AIMD in-flight limit for Gemini calls (summed over workers)",
+    multiprocess_mode="livesum",
+)
+PACING_INTERVAL = Gauge(
+    "medanalyzer_pacing_interval_seconds",
+    "Current minimum spacing between Gemini call starts",
+    multiprocess_mode="livemax",
+)
+TOKENS = Counter(
+    "medanalyzer_tokens_total",
+    "Gemini tokens consumed",
+    ["direction"],                      # in | out
+)
+PAGES = Counter("medanalyzer_pdf_pages_total", "PDF pages extracted")
+CHUNKS = Counter("medanalyzer_chunks_total", "Text chunks sent for classification")
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time the enclosed block and record it under
+    medanalyzer_stage_seconds{stage=name}.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage=name).observe(time.perf_counter() - t0)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Prometheus text exposition of every metric above.
+    Under a pre-fork server (PROMETHEUS_MULTIPROC_DIR set) the values of
+    all worker processes are merged.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+# ────────────────────────── 2) Slow-request profiler ──────────────────────────
+SLOW_REQUEST_MS  = float(os.getenv("SLOW_REQUEST_MS", "0"))      # 0 = disabled
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_TOP      = 15
+
+
+def _frame_key(frame) -> str:
+    """Collapse a stack into 'file:line func;…' (root first)."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def _thread_names() -> dict[int, str]:
+    return {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+
+
+@contextmanager
+def profile_if_slow(label: str, threads: str | None = None):
+    """
+    Sample the calling thread's stack every PROFILE_INTERVAL_MS while the
+    block runs, plus the workers of any ThreadPoolExecutor created with
+    thread_name_prefix=`threads` (where the HTTP and parse work happens).
+    If the block takes longer than SLOW_REQUEST_MS the hottest stacks are
+    logged (collapsed format, ready for flamegraph.pl), each prefixed with
+    its thread kind.
+    A no-op when SLOW_REQUEST_MS is 0.
+    """
+    if SLOW_REQUEST_MS <= 0:
+        yield
+        return
+
+    target  = threading.get_ident()
+    samples = _Tally()
+    done    = threading.Event()
+
+    pool    = threads + "_" if threads else None   # executor names are prefix_N
+
+    def sampler():
+        while not done.wait(PROFILE_INTERVAL):
+            frames = sys._current_frames()
+            frame  = frames.get(target)
+            if frame is not None:
+                samples["request;" + _frame_key(frame)] += 1
+            if pool is None:
+                continue
+            for ident, name in _thread_names().items():
+                if name.startswith(pool) and ident in frames:
+                    samples["chunk;" + _frame_key(frames[ident])] += 1
+
+    th = threading.Thread(target=sampler, name="slow-request-profiler", daemon=True)
+    t0 = time.perf_counter()
+    th.start()
+    try:
+        yield
+    finally:
+        done.set()
+        th.join()
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        if elapsed_ms >= SLOW_REQUEST_MS and samples:
+            total = sum(samples.values())
+            lines = [f"{n} {stack}" for stack, n in samples.most_common(PROFILE_TOP)]
+            log.warning("slow request %s: %.0f ms, %d samples\n%s",
+                        label, elapsed_ms, total, "\n".join(lines))
@@ -0,0 +1,135 @@
+"""
+Local stand-in for the Gemini generateContent endpoint, for load tests.
+
+Every non-empty line of the prompt's "List:" section is echoed back as a
+medicine; alternate lines go to "relevant" / "irrelevant". Latency is
+configurable so worker scaling can be measured without spending quota.
+Throttling can be injected to exercise the adaptive limiter:
+
+  --max-rps        quota; calls above it get 429 + Retry-After
+  --throttle-rate  fraction of calls answered 429 at random
+  --error-rate     fraction of calls answered with --error-status
+                   (default 503) at random
+
+Usage:
+    python mock_gemini.py --port 8089 --latency-ms 400
+    python mock_gemini.py --max-rps 5 --error-rate 0.02
+    GEMINI_API_BASE=http://127.0.0.1:8089 GEMINI_API_KEY=mock python app.py
+"""
+import json, time, random, argparse, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class TokenBucket:
+    """`rate` calls per second with a one-second burst."""
+    def __init__(self, rate: float):
+        self.rate, self.tokens = rate, rate
+        self.stamp = time.monotonic()
+        self.lock  = threading.Lock()
+
+    def take(self) -> float:
+        """0 if a call is allowed, else seconds until the next token."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp  = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class MockGemini(BaseHTTPRequestHandler):
+    latency       = 0.0     # seconds, set by serve()
+    jitter        = 0.0
+    throttle_rate = 0.0
+    error_rate    = 0.0
+    error_status  = 503
+    quota: TokenBucket | None = None
+    counts: dict  = {}
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, payload: dict, retry_after: float = 0.0):
+        body = json.dumps(payload).encode()
+        self.counts[status] = self.counts.get(status, 0) + 1
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if retry_after:
+            self.send_header("Retry-After", f"{retry_after:.2f}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        req    = json.loads(self.rfile.read(length) or b"{}")
+        prompt = req["contents"][0]["parts"][0]["text"]
+
+        wait = self.quota.take() if self.quota else 0.0
+        if wait or random.random() < self.throttle_rate:
+            return self._send(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}},
+                              retry_after=wait)
+        if random.random() < self.error_rate:
+            return self._send(self.error_status,
+                              {"error": {"code": self.error_status, "status": "INJECTED"}})
+
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        items = [ln.strip() for ln in prompt.split("List:", 1)[-1].splitlines()
+                 if ln.strip()]
+        out = {"relevant": [], "irrelevant": []}
+        for i, name in enumerate(items):
+            out["relevant" if i % 2 == 0 else "irrelevant"].append(
+                {"name": name[:60], "explanation": "mock"})
+
+        self._send(200, {
+            "candidates": [{"content": {"parts": [
+                {"text": "```json\n" + json.dumps(out) + "\n```"}]}}],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4,
+                              "candidatesTokenCount": len(items) * 8},
+        })
+
+
+def serve(port: int = 0, latency_ms: float = 0, jitter_ms: float = 0,
+          max_rps: float = 0, throttle_rate: float = 0, error_rate: float = 0,
+          error_status: int = 503):
+    """
+    Start the mock in a daemon thread; returns the running server.
+    `server.RequestHandlerClass.counts` tallies responses by status.
+    """
+    handler = type("Handler", (MockGemini,), {
+        "latency":       latency_ms / 1000,
+        "jitter":        jitter_ms / 1000,
+        "quota":         TokenBucket(max_rps) if max_rps else None,
+        "throttle_rate": throttle_rate,
+        "error_rate":    error_rate,
+        "error_status":  error_status,
+        "counts":        {},
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency-ms", type=float, default=400)
+    ap.add_argument("--jitter-ms", type=float, default=100)
+    ap.add_argument("--max-rps", type=float, default=0, help="0 = unlimited")
+    ap.add_argument("--throttle-rate", type=float, default=0)
+    ap.add_argument("--error-rate", type=float, default=0)
+    ap.add_argument("--error-status", type=int, default=503)
+    args = ap.parse_args()
+    srv = serve(args.port, args.latency_ms, args.jitter_ms,
+                args.max_rps, args.throttle_rate, args.error_rate, args.error_status)
+    print(f"mock Gemini on http://127.0.0.1:{srv.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
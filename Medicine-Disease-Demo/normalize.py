@@ -0,0 +1,179 @@
+import os, re, csv, logging
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from symspellpy import SymSpell, Verbosity
+
+log = logging.getLogger("medanalyzer")
+
+# ────────────────────────── 1) Dictionary ──────────────────────────
+HERE = os.path.dirname(os.path.abspath(__file__))
+MEDICINE_DICTIONARY = os.getenv(
+    "MEDICINE_DICTIONARY",
+    os.path.join(HERE, "..", "Medicine-spell-correction", "medicine_spelling_dataset.csv"),
+)
+MAX_EDIT_DISTANCE = 2
+CANON_CACHE_SIZE  = 4096
+
+
+def _load_dictionary(path: str) -> Dict[str, str]:
+    """lower-case name → display name, from the `medicine_name` column."""
+    names: Dict[str, str] = {}
+    try:
+        with open(path, newline="", encoding="utf-8") as fh:
+            for row in csv.DictReader(fh):
+                name = (row.get("medicine_name") or "").strip()
+                if name:
+                    names.setdefault(name.lower(), name)
+    except FileNotFoundError:
+        log.warning("medicine dictionary %s not found; names are only cleaned, "
+                    "not spell-corrected", path)
+    return names
+
+
+# Same SymSpell setup as HybridMedicineCorrector (edit distance 2, prefix 7)
+_DISPLAY  = _load_dictionary(MEDICINE_DICTIONARY)
+_symspell = SymSpell(max_dictionary_edit_distance=MAX_EDIT_DISTANCE, prefix_length=7)
+for _key in _DISPLAY:
+    _symspell.create_dictionary_entry(_key, 1)
+
+# ────────────────────────── 2) Cleaning ──────────────────────────
+_PARENS   = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+_DOSE     = re.compile(
+    r"\b\d+(?:[.,]\d+)?\s*"
+    r"(?:mg|mcg|µg|ug|g|gm|kg|ml|l|iu|units?|mmol|meq|%)?"
+    r"(?:\s*/\s*\d*(?:[.,]\d+)?\s*(?:mg|mcg|g|ml|l|dose|hr|h))?(?=\W|$)",
+    flags=re.I,
+)
+_FORM     = re.compile(
+    r"\b(?:tablets?|tabs?|capsules?|caps?|caplets?|syrup|suspension|solution|"
+    r"injection|inj|infusion|cream|ointment|gel|lotion|drops?|spray|inhaler|"
+    r"patch(?:es)?|oral|topical|chewable|dispersible|film[- ]coated|"
+    r"extended[- ]release|sustained[- ]release|delayed[- ]release|"
+    r"er|xr|sr|xl|cr|dr|ir|la|od|ip|usp|bp)\b",
+    flags=re.I,
+)
+# Counter-ions and salt forms. Dropped only within the same ingredient as
+# a real active, so "Sodium chloride" and "Potassium chloride" stay apart.
+_SALTS = frozenset("""
+    hcl hydrochloride hydrobromide sodium potassium calcium magnesium zinc
+    ferrous maleate mesylate besylate tartrate succinate citrate sulfate
+    sulphate phosphate acetate fumarate bromide chloride gluconate carbonate
+    bicarbonate lactate oxide hydroxide iodide nitrate
+""".split())
+# Separators between the ingredients of a combination product
+_COMBO    = re.compile(r"[+/,&]|\b(?:and|with)\b", flags=re.I)
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+
+
+def _clean_ingredient(text: str) -> str:
+    tokens = _NON_WORD.sub(" ", text.lower()).split()
+    core   = [t for t in tokens if t not in _SALTS]
+    return " ".join(core or tokens)
+
+
+def _clean(name: str) -> str:
+    """
+    'METFORMIN HCl 500mg tab' → 'metformin'; 'Sodium Chloride 0.9%' → 'sodium chloride'
+    Combinations are cleaned per ingredient and joined in sorted order, so a
+    salt word never crosses a separator:
+    'Calcium + Vitamin D3' → 'calcium + vitamin d3' (not 'vitamin d3')
+    """
+    text = _PARENS.sub(" ", name)
+    text = _DOSE.sub(" ", text)
+    text = _FORM.sub(" ", text)
+    parts = {_clean_ingredient(part) for part in _COMBO.split(text)}
+    return " + ".join(sorted(p for p in parts if p))
+
+
+def _max_distance(term: str) -> int:
+    """
+    Edits allowed for a fuzzy match. Never more than one: with a small
+    dictionary, two edits turn real drugs into different ones
+    (Prednisolone → Prednisone, Ampicillin → Amoxicillin).
+    """
+    return 1 if len(term) >= 6 else 0
+
+
+def _correct(key: str) -> str | None:
+    """
+    The dictionary term `key` is clearly a misspelling of, or None.
+    Accepted only when exactly one term is within the allowed distance
+    and no other term is within MAX_EDIT_DISTANCE, so a name that sits
+    between two dictionary entries is left alone.
+    """
+    allowed = _max_distance(key)
+    if not allowed:
+        return None
+    hits = _symspell.lookup(key, Verbosity.ALL, max_edit_distance=MAX_EDIT_DISTANCE)
+    close = [h for h in hits if h.distance <= allowed]
+    if len(close) == 1 and len(hits) == 1:
+        return close[0].term
+    return None
+
+
+@lru_cache(maxsize=CANON_CACHE_SIZE)
+def canonical_name(name: str) -> Tuple[str, str]:
+    """
+    Returns (key, display) for a raw LLM medicine name.
+      key     – canonical lower-case form used for merging
+      display – dictionary spelling when the name resolves to a known
+                drug, otherwise the raw name stripped of whitespace
+    """
+    raw = name.strip()
+    key = _clean(raw) or raw.lower()
+
+    if key in _DISPLAY:
+        return key, _DISPLAY[key]
+
+    term = _correct(key) if " + " not in key else None    # combos: as cleaned
+    if term is not None:
+        return term, _DISPLAY[term]
+
+    return key, raw
+
+
+# ────────────────────────── 3) Aggregation index ──────────────────────────
+LABELS = ("relevant", "irrelevant")
+
+
+class MedicineIndex:
+    """
+    Merges per-chunk classifications on canonical_name() keys.
+
+    Conflict policy (deterministic for a given chunk order):
+      • a medicine goes to the label it received most often;
+        a tie goes to "irrelevant" (the conservative answer)
+      • the explanation is the first non-empty one seen for that label
+      • the display name is the one produced for the first occurrence
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, dict] = {}
+
+    def add(self, label: str, obj: dict) -> None:
+        key, display = canonical_name(obj["name"])
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = {
+                "name":        display,
+                "votes":       dict.fromkeys(LABELS, 0),
+                "explanation": dict.fromkeys(LABELS, ""),
+            }
+        entry["votes"][label] += 1
+        if not entry["explanation"][label]:
+            entry["explanation"][label] = obj.get("explanation") or ""
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def split(self) -> Dict[str, List[dict]]:
+        """{"relevant": [...], "irrelevant": [...]}, each sorted by name."""
+        out: Dict[str, List[dict]] = {lbl: [] for lbl in LABELS}
+        for entry in self._entries.values():
+            votes = entry["votes"]
+            label = "relevant" if votes["relevant"] > votes["irrelevant"] else "irrelevant"
+            out[label].append({"name": entry["name"],
+                               "explanation": entry["explanation"][label]})
+        for lst in out.values():
+            lst.sort(key=lambda d: d["name"].lower())
+        return out
@@ -0,0 +1,97 @@
+import os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import app, controller, mock_gemini
+
+
+def _prompts(n):
+    return [f"List:\nDrug{i}" for i in range(n)]
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """
+    start(**serve_kwargs) runs mock_gemini with the given faults and points
+    app at it through a fresh limiter. Backoff is shortened so the tests
+    take seconds; Retry-After from the mock still applies.
+    """
+    servers = []
+
+    def start(**opts):
+        srv = mock_gemini.serve(0, **opts)
+        servers.append(srv)
+        monkeypatch.setattr(app, "API_URL", f"http://127.0.0.1:{srv.server_port}")
+        monkeypatch.setattr(app, "limiter", controller.AdaptiveController(start=4))
+        return srv
+
+    monkeypatch.setattr(controller, "BACKOFF_BASE", 0.05)
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_no_chunk_is_lost_under_throttling(gemini):
+    srv = gemini(latency_ms=20, max_rps=10, throttle_rate=0.1, error_rate=0.03)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(app.classify_chunk, _prompts(30)))
+
+    assert all(r["ok"] for r in results)
+    counts = srv.RequestHandlerClass.counts
+    assert counts[200] == 30 and counts.get(429, 0) > 0
+    assert app.limiter.inflight == 0
+
+
+def test_limit_decreases_on_429_and_grows_back(gemini):
+    srv = gemini(latency_ms=10, throttle_rate=1.0)
+    r = app.classify_chunk("List:\nDrug")
+    assert (r["ok"], r["status"], r["attempts"]) == (False, 429, controller.MAX_ATTEMPTS)
+    low = app.limiter.limit
+    assert low < 4 and app.limiter.interval > 0
+
+    srv.RequestHandlerClass.throttle_rate = 0.0
+    for prompt in _prompts(3):
+        assert app.classify_chunk(prompt)["ok"]
+    assert app.limiter.limit > low
+
+
+def test_call_exception_releases_the_slot(gemini, monkeypatch):
+    gemini()
+
+    def boom(prompt):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(app, "call_gemini", boom)
+    r = app.classify_chunk("List:\nDrug")
+    assert not r["ok"] and r["attempts"] == controller.MAX_ATTEMPTS
+    assert app.limiter.inflight == 0
+
+
+def test_retry_after_delays_the_next_call(gemini):
+    gemini(max_rps=2)                           # one-second burst of 2 calls
+    app.call_gemini("List:\nA")
+    app.call_gemini("List:\nB")
+    r = app.call_gemini("List:\nC")
+    assert r["status"] == 429 and r["retry_after"] > 0
+
+    app.limiter.acquire()
+    app.limiter.release(r["status"], r["elapsed"], r["retry_after"])
+    t0 = time.monotonic()
+    app.limiter.acquire()
+    waited = time.monotonic() - t0
+    app.limiter.release(200, 0.01)
+    assert waited >= 0.9 * r["retry_after"]
+
+
+def test_other_4xx_only_counts_a_client_error(gemini):
+    gemini(error_rate=1.0, error_status=403)
+    before = app.limiter.snapshot()
+    r = app.classify_chunk("List:\nDrug")
+    after = app.limiter.snapshot()
+
+    assert (r["status"], r["attempts"]) == (403, 1)
+    assert after.pop("client_errors") == before.pop("client_errors") + 1
+    assert after == before
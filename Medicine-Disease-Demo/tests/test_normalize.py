@@ -0,0 +1,78 @@
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from normalize import canonical_name, MedicineIndex
+
+
+@pytest.mark.parametrize("raw", [
+    "Metformin", "metformin 500mg", "METFORMIN HCl", "Metfornin",
+    "Metformin ER 500 mg tablets",
+])
+def test_variants_merge_to_dictionary_name(raw):
+    assert canonical_name(raw) == ("metformin", "Metformin")
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("Zolpiden 10mg", "zolpidem"),
+    ("Atrovastatin", "atorvastatin"),
+    ("Gabapentain", "gabapentin"),
+])
+def test_single_edit_misspellings_are_corrected(raw, expected):
+    assert canonical_name(raw)[0] == expected
+
+
+@pytest.mark.parametrize("raw, near", [
+    ("Prednisolone", "prednisone"),
+    ("Ampicillin", "amoxicillin"),
+    ("Esomeprazole", "omeprazole"),
+    ("Lansoprazole", "pantoprazole"),
+])
+def test_real_drugs_are_not_turned_into_neighbours(raw, near):
+    key, display = canonical_name(raw)
+    assert key == raw.lower() and key != near
+    assert display == raw
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Sodium chloride", "Potassium chloride"),
+    ("Calcium gluconate", "Potassium gluconate"),
+])
+def test_salt_only_names_stay_distinct(a, b):
+    assert canonical_name(a)[0] != canonical_name(b)[0]
+
+
+def test_salt_is_stripped_next_to_an_active_ingredient():
+    assert canonical_name("Naproxen sodium 220mg") == ("naproxen", "Naproxen")
+    assert canonical_name("Sodium chloride 0.9%")[0] == "sodium chloride"
+
+
+@pytest.mark.parametrize("combo, single", [
+    ("Calcium + Vitamin D3",                      "Vitamin D3"),
+    ("Calcium carbonate + Vitamin D3 500mg",      "Vitamin D3"),
+    ("Ferrous sulfate + Folic acid",              "Folic acid"),
+    ("Magnesium hydroxide + Aluminium hydroxide", "Aluminium hydroxide"),
+])
+def test_combinations_do_not_merge_into_one_ingredient(combo, single):
+    assert canonical_name(combo)[0] != canonical_name(single)[0]
+
+
+def test_salts_are_not_stripped_across_separators():
+    assert canonical_name("Calcium + Vitamin D3")[0] == "calcium + vitamin d3"
+    assert canonical_name("Ferrous sulfate + Folic acid")[0] == "ferrous sulfate + folic acid"
+    assert canonical_name("Iron and folic acid")[0] == canonical_name("Folic acid / Iron")[0]
+    assert canonical_name("Amoxicillin/Clavulanate potassium 875/125mg")[0] \
+        == "amoxicillin + clavulanate"
+
+
+def test_conflicts_resolve_by_majority_and_ties_go_irrelevant():
+    index = MedicineIndex()
+    index.add("relevant",   {"name": "Metformin",       "explanation": "a"})
+    index.add("irrelevant", {"name": "METFORMIN HCl",   "explanation": "b"})
+    index.add("relevant",   {"name": "metformin 500mg", "explanation": "c"})
+    index.add("relevant",   {"name": "Ibuprofen",       "explanation": "d"})
+    index.add("irrelevant", {"name": "ibuprofen 400mg", "explanation": "e"})
+
+    merged = index.split()
+    assert merged["relevant"]   == [{"name": "Metformin", "explanation": "a"}]
+    assert merged["irrelevant"] == [{"name": "Ibuprofen", "explanation": "e"}]
@@ -127,21 +127,22 @@ class HybridMedicineCorrector:
         }
 
 # Usage and benchmarking
-hybrid_corrector = HybridMedicineCorrector()
+if __name__ == "__main__":
+    hybrid_corrector = HybridMedicineCorrector()
 
-test_cases = [
-    ("Ammoxicillin", "Patient needs antibiotic treatment"),
-    ("Zolpiden", "Sleep aid medication for insomnia"),
-    ("Gabapentain", "Nerve pain medication"),
-    ("Atrovastatin", "Cholesterol lowering medication")
-]
+    test_cases = [
+        ("Ammoxicillin", "Patient needs antibiotic treatment"),
+        ("Zolpiden", "Sleep aid medication for insomnia"),
+        ("Gabapentain", "Nerve pain medication"),
+        ("Atrovastatin", "Cholesterol lowering medication")
+    ]
 
-print("=== Hybrid Method Performance ===")
-for misspelled, context in test_cases:
-    result = hybrid_corrector.correct_with_timing(misspelled, context)
-    print(f"\nOriginal: {result['original']}")
-    print(f"Corrected: {result['corrected']}")
-    print(f"Candidates: {result['candidates']}")
-    print(f"SymSpell Time: {result['symspell_time']:.1f}ms")
-    print(f"LLM Time: {result['llm_time']:.1f}ms")
-    print(f"Total Time: {result['total_time']:.1f}ms")
+    print("=== Hybrid Method Performance ===")
+    for misspelled, context in test_cases:
+        result = hybrid_corrector.correct_with_timing(misspelled, context)
+        print(f"\nOriginal: {result['original']}")
+        print(f"Corrected: {result['corrected']}")
+        print(f"Candidates: {result['candidates']}")
+        print(f"SymSpell Time: {result['symspell_time']:.1f}ms")
+        print(f"LLM Time: {result['llm_time']:.1f}ms")
+        print(f"Total Time: {result['total_time']:.1f}ms")
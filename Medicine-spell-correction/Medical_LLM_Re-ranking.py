@@ -98,16 +98,17 @@ class MedicalLLMCorrector:
         return candidates[0]
 
 # Usage example
-corrector = MedicalLLMCorrector()
+if __name__ == "__main__":
+    corrector = MedicalLLMCorrector()
 
-# Test cases
-test_cases = [
-    ("Ammoxicillin", "Patient prescribed antibiotics for infection"),
-    ("Zolpiden", "Take 10mg tablet at bedtime for insomnia"),
-    ("Gabapentain", "300mg three times daily for neuropathic pain"),
-    ("Metfornin", "500mg twice daily with meals for diabetes")
-]
+    # Test cases
+    test_cases = [
+        ("Ammoxicillin", "Patient prescribed antibiotics for infection"),
+        ("Zolpiden", "Take 10mg tablet at bedtime for insomnia"),
+        ("Gabapentain", "300mg three times daily for neuropathic pain"),
+        ("Metfornin", "500mg twice daily with meals for diabetes")
+    ]
 
-for misspelled, context in test_cases:
-    correction = corrector.correct_medicine(misspelled, context)
-    print(f"'{misspelled}' → '{correction}' (Context: {context[:30]}...)")
+    for misspelled, context in test_cases:
+        correction = corrector.correct_medicine(misspelled, context)
+        print(f"'{misspelled}' → '{correction}' (Context: {context[:30]}...)")
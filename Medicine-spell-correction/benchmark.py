@@ -0,0 +1,377 @@
+"""
+Offline accuracy-vs-latency benchmark for the medicine spelling correctors.
+
+Generates realistic misspellings of every name in medicine_spelling_dataset.csv
+(keyboard edits, transpositions, phonetic swaps, OCR confusions) and runs each
+corrector on the same query set:
+
+  symspell – SymSpell lookup only (the candidate stage of Hybrid.py)
+  difflib  – difflib.get_close_matches (the candidate stage of the re-ranker)
+  hybrid   – HybridMedicineCorrector   (Hybrid.py)
+  llm      – MedicalLLMCorrector       (Medical_LLM_Re-ranking.py)
+
+Every query carries a prescription-style context sentence built from the
+true drug's therapeutic class (see DRUG_CLASSES), so the re-ranking
+correctors actually re-rank; without context they return their first
+candidate and collapse into the symspell / difflib baselines. --context
+overrides it with one fixed sentence for all queries.
+
+Caveat: the context is derived from the answer, so it leaks the true
+drug's class. That favours hybrid / llm over symspell / difflib (which
+ignore context); their accuracy is an upper bound for prescriptions
+whose text really names the indication. The JSON config records this.
+
+Each corrector runs in its own process so memory numbers are not shared.
+Reported: top-1 / top-k accuracy (overall and per error kind), p50/p90/p99
+latency, throughput, build time and RSS.
+
+Usage:
+    python benchmark.py --queries 10000 --out benchmark_results.json
+    python benchmark.py -c symspell,difflib --accuracy-bar 0.9
+"""
+import os, sys, csv, json, time, random, argparse, resource, subprocess
+import importlib.util
+from difflib import get_close_matches
+
+HERE       = os.path.dirname(os.path.abspath(__file__))
+DATASET    = os.path.join(HERE, "medicine_spelling_dataset.csv")
+CORRECTORS = ("symspell", "difflib", "hybrid", "llm")
+
+# ────────────────────────── 1) Misspelling generator ──────────────────────────
+ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+PHONETIC = [("ph", "f"), ("f", "ph"), ("c", "k"), ("k", "c"), ("x", "ks"),
+            ("qu", "kw"), ("y", "i"), ("i", "y"), ("ee", "ea"), ("ou", "u"),
+            ("tion", "shun"), ("z", "s"), ("s", "z"), ("ine", "een"),
+            ("ll", "l"), ("mm", "m"), ("pp", "p"), ("cc", "c"), ("l", "ll"),
+            ("m", "mm"), ("ia", "ya"), ("ch", "k"), ("th", "t"), ("ae", "e")]
+OCR      = [("l", "1"), ("i", "l"), ("o", "0"), ("O", "0"), ("rn", "m"),
+            ("m", "rn"), ("cl", "d"), ("d", "cl"), ("vv", "w"), ("w", "vv"),
+            ("S", "5"), ("s", "5"), ("B", "8"), ("e", "c"), ("c", "e"),
+            ("a", "o"), ("n", "ri"), ("h", "b"), ("u", "v"), ("g", "q")]
+KINDS    = ("edit", "transposition", "phonetic", "ocr")
+
+# ────────────────────────── Query contexts ──────────────────────────
+DRUG_CLASSES = {
+    "analgesic for pain and fever":
+        "Acetaminophen Ibuprofen Naproxen Celecoxib Meloxicam",
+    "opioid analgesic for severe pain":
+        "Fentanyl Hydrocodone Oxycodone Tramadol Methadone",
+    "antibiotic for a bacterial infection":
+        "Amoxicillin Azithromycin Cephalexin Ciprofloxacin Clindamycin Doxycycline",
+    "antidepressant for depression and anxiety":
+        "Bupropion Citalopram Escitalopram Fluoxetine Sertraline Duloxetine "
+        "Cymbalta Venlafaxine Nortriptyline Trazodone",
+    "antipsychotic for schizophrenia or bipolar disorder":
+        "Aripiprazole Quetiapine Risperidone",
+    "sedative or anxiolytic for anxiety and insomnia":
+        "Alprazolam Clonazepam Buspirone Zolpidem",
+    "stimulant for ADHD": "Adderall",
+    "antiepileptic for seizures and neuropathic pain":
+        "Gabapentin Valproic acid",
+    "muscle relaxant for spasm": "Baclofen Cyclobenzaprine",
+    "antihistamine for allergy symptoms": "Benadryl Loratadine",
+    "antihypertensive for high blood pressure":
+        "Amlodipine Lisinopril Losartan Metoprolol Propranolol "
+        "Hydrochlorothiazide Spironolactone",
+    "statin for high cholesterol":
+        "Atorvastatin Rosuvastatin Simvastatin Ezetimibe",
+    "anticoagulant or antiplatelet to prevent clots":
+        "Warfarin Apixaban Dabigatran Clopidogrel Ticagrelor",
+    "antidiabetic for type 2 diabetes":
+        "Metformin Insulin glargine Liraglutide",
+    "thyroid hormone for hypothyroidism": "Levothyroxine",
+    "acid reducer for reflux and ulcers":
+        "Omeprazole Pantoprazole Ranitidine",
+    "antiemetic or antidiarrheal for nausea and diarrhea":
+        "Ondansetron Imodium",
+    "corticosteroid for inflammation":
+        "Prednisone Methylprednisolone",
+    "migraine treatment": "Sumatriptan",
+    "antiviral for herpes infection": "Valacyclovir",
+    "treatment for benign prostatic hyperplasia": "Tamsulosin",
+    "biologic for autoimmune disease":
+        "Ustekinumab Vedolizumab Secukinumab Infliximab Etanercept "
+        "Abatacept Tocilizumab",
+    "osteoporosis treatment":
+        "Teriparatide Denosumab Alendronate Zoledronic acid",
+    "supportive therapy for neutropenia": "Filgrastim",
+    "oncology therapy for cancer":
+        "Tamoxifen Rituximab Pembrolizumab Nivolumab Atezolizumab Olaparib "
+        "Ibrutinib Imatinib Sunitinib Sorafenib Bevacizumab Trastuzumab "
+        "Cetuximab Erlotinib Lapatinib Osimertinib Palbociclib Crizotinib",
+}
+_MULTIWORD = ("Valproic acid", "Insulin glargine", "Zoledronic acid")
+_CLASS_OF  = {}
+for _cls, _names in DRUG_CLASSES.items():
+    for _m in _MULTIWORD:
+        if _m in _names:
+            _CLASS_OF[_m.lower()] = _cls
+            _names = _names.replace(_m, "")
+    for _n in _names.split():
+        _CLASS_OF[_n.lower()] = _cls
+
+
+def context_for(truth: str) -> str:
+    """Prescription-style sentence naming the drug's therapeutic class."""
+    cls = _CLASS_OF.get(truth.lower(), "medication as directed")
+    return f"Patient prescribed {cls}; take as directed by the physician."
+
+
+def _edit(word, rng):
+    i  = rng.randrange(len(word))
+    op = rng.choice(("insert", "delete", "substitute"))
+    if op == "insert":
+        return word[:i] + rng.choice(ALPHABET) + word[i:]
+    if op == "delete" and len(word) > 3:
+        return word[:i] + word[i + 1:]
+    return word[:i] + rng.choice(ALPHABET.replace(word[i].lower(), "")) + word[i + 1:]
+
+
+def _transpose(word, rng):
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def _swap(word, rng, table):
+    hits = [(a, b, i) for a, b in table
+            for i in range(len(word)) if word.startswith(a, i)]
+    if not hits:
+        return None
+    a, b, i = rng.choice(hits)
+    return word[:i] + b + word[i + len(a):]
+
+
+def misspell(word, kind, rng):
+    """One corruption of `kind`; falls back to a plain edit when no rule applies."""
+    if kind == "transposition":
+        out = _transpose(word, rng)
+    elif kind == "phonetic":
+        out = _swap(word, rng, PHONETIC)
+    elif kind == "ocr":
+        out = _swap(word, rng, OCR)
+    else:
+        out = None
+    return out or _edit(word, rng)
+
+
+def load_names(path=DATASET):
+    with open(path, newline="", encoding="utf-8") as fh:
+        return [r["medicine_name"].strip() for r in csv.DictReader(fh)
+                if r.get("medicine_name", "").strip()]
+
+
+def generate_queries(names, n, seed=0, max_errors=3):
+    """[(misspelled, truth, kind), …] – deterministic for a given seed."""
+    rng, out = random.Random(seed), []
+    while len(out) < n:
+        truth = rng.choice(names)
+        kind  = rng.choice(KINDS)
+        bad   = truth
+        for _ in range(rng.randint(1, max_errors)):
+            bad = misspell(bad, kind, rng)
+        if bad.lower() != truth.lower():
+            out.append((bad, truth, kind))
+    return out
+
+
+# ────────────────────────── 2) Corrector adapters ──────────────────────────
+def _load_module(filename, name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    mod  = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def _dedup(seq):
+    return list(dict.fromkeys(s.lower() for s in seq if s))
+
+
+def build_corrector(kind, names, k):
+    """Returns predict(query, context) → ranked list of lower-case candidates."""
+    lower = [n.lower() for n in names]
+
+    if kind == "symspell":
+        from symspellpy import SymSpell, Verbosity
+        sym = SymSpell(max_dictionary_edit_distance=2, prefix_length=7)
+        for n in lower:
+            sym.create_dictionary_entry(n, 1)
+        return lambda q, ctx: [s.term for s in
+                               sym.lookup(q.lower(), Verbosity.ALL, max_edit_distance=2)[:k]]
+
+    if kind == "difflib":
+        return lambda q, ctx: get_close_matches(q.lower(), lower, n=k, cutoff=0.4)
+
+    if kind == "hybrid":
+        hc = _load_module("Hybrid.py", "Hybrid").HybridMedicineCorrector()
+
+        def predict(q, ctx):
+            r = hc.correct_with_timing(q, ctx)
+            return _dedup([r["corrected"], *r.get("candidates", [])])[:k]
+        return predict
+
+    if kind == "llm":
+        lc = _load_module("Medical_LLM_Re-ranking.py", "medical_llm_reranking") \
+                .MedicalLLMCorrector()
+
+        def predict(q, ctx):
+            # correct_medicine() generates candidates itself; hand it the
+            # list computed here so difflib only runs once per query.
+            cands = lc._generate_candidates(q)
+            lc._generate_candidates = lambda _q: cands
+            try:
+                best = lc.correct_medicine(q, ctx)
+            finally:
+                del lc._generate_candidates          # back to the class method
+            return _dedup([best, *cands])[:k]
+        return predict
+
+    raise ValueError(f"unknown corrector {kind!r}")
+
+
+# ────────────────────────── 3) Measurement ──────────────────────────
+def _rss_mb():
+    """Current RSS (Linux /proc), else peak RSS."""
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return _peak_rss_mb()
+
+
+def _peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _pct(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+def run_corrector(kind, args):
+    names   = load_names(args.dataset)
+    queries = generate_queries(names, args.queries, args.seed, args.max_errors)
+
+    rss0 = _rss_mb()
+    t0   = time.perf_counter()
+    predict = build_corrector(kind, names, args.k)
+    build_s = time.perf_counter() - t0
+    rss_built = _rss_mb()
+
+    lat, top1, topk = [], 0, 0
+    per_kind = {kd: [0, 0, 0] for kd in KINDS}       # n, top1, topk
+    t_run = time.perf_counter()
+    for bad, truth, kd in queries:
+        ctx = args.context if args.context is not None else context_for(truth)
+        t = time.perf_counter()
+        cands = predict(bad, ctx)
+        lat.append((time.perf_counter() - t) * 1000)
+
+        truth = truth.lower()
+        hit1  = bool(cands) and cands[0] == truth
+        hitk  = truth in cands[:args.k]
+        top1 += hit1
+        topk += hitk
+        pk = per_kind[kd]
+        pk[0] += 1; pk[1] += hit1; pk[2] += hitk
+    run_s = time.perf_counter() - t_run
+
+    n = len(queries)
+    lat.sort()
+    return {
+        "corrector":      kind,
+        "queries":        n,
+        "top1":           top1 / n,
+        "topk":           topk / n,
+        "k":              args.k,
+        "by_kind":        {kd: {"queries": c, "top1": h1 / c if c else 0.0,
+                                "topk": hk / c if c else 0.0}
+                           for kd, (c, h1, hk) in per_kind.items()},
+        "latency_ms":     {"p50": _pct(lat, .50), "p90": _pct(lat, .90),
+                           "p99": _pct(lat, .99), "mean": sum(lat) / n},
+        "throughput_qps": n / run_s if run_s else 0.0,
+        "build_seconds":  build_s,
+        "rss_mb":         {"baseline": rss0, "after_build": rss_built,
+                           "model": rss_built - rss0, "peak": _peak_rss_mb()},
+    }
+
+
+# ────────────────────────── 4) CLI ──────────────────────────
+def _parse_args(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-c", "--correctors", default=",".join(CORRECTORS),
+                    help="comma-separated subset of: " + ", ".join(CORRECTORS))
+    ap.add_argument("-n", "--queries", type=int, default=10_000)
+    ap.add_argument("-k", type=int, default=5, help="k for top-k accuracy")
+    ap.add_argument("--max-errors", type=int, default=3,
+                    help="corruptions applied per query (1..N)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--context", default=None,
+                    help="fixed context for every query (default: per-drug "
+                         "class sentence; '' disables re-ranking)")
+    ap.add_argument("--dataset", default=DATASET)
+    ap.add_argument("--accuracy-bar", type=float,
+                    help="recommend the fastest corrector with top-1 ≥ this")
+    ap.add_argument("--out", default="benchmark_results.json")
+    ap.add_argument("--_child", help=argparse.SUPPRESS)
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+
+    if args._child:
+        print(json.dumps(run_corrector(args._child, args)))
+        return
+
+    passthrough = list(argv if argv is not None else sys.argv[1:])
+    results = []
+    for kind in [c.strip() for c in args.correctors.split(",") if c.strip()]:
+        proc = subprocess.run([sys.executable, __file__, *passthrough, "--_child", kind],
+                              capture_output=True, text=True)
+        if proc.returncode:
+            err = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+            print(f"{kind}: {err}", file=sys.stderr)
+            results.append({"corrector": kind, "error": err})
+        else:
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f"{'corrector':10} {'top1':>6} {'top'+str(args.k):>6} {'p50 ms':>8} "
+          f"{'p99 ms':>8} {'q/s':>9} {'build s':>8} {'RSS MB':>8}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['corrector']:10} error")
+            continue
+        print(f"{r['corrector']:10} {r['top1']:6.3f} {r['topk']:6.3f} "
+              f"{r['latency_ms']['p50']:8.3f} {r['latency_ms']['p99']:8.3f} "
+              f"{r['throughput_qps']:9.0f} {r['build_seconds']:8.2f} "
+              f"{r['rss_mb']['after_build']:8.1f}")
+
+    recommended = None
+    if args.accuracy_bar is not None:
+        ok = [r for r in results if "error" not in r and r["top1"] >= args.accuracy_bar]
+        if ok:
+            recommended = min(ok, key=lambda r: r["latency_ms"]["p50"])["corrector"]
+        print(f"\ncheapest corrector with top-1 ≥ {args.accuracy_bar}: {recommended}")
+
+    report = {
+        "config": {"queries": args.queries, "k": args.k, "seed": args.seed,
+                   "max_errors": args.max_errors,
+                   "context": "per-drug class" if args.context is None else args.context,
+                   "context_leaks_answer_class": args.context is None,
+                   "dataset": os.path.basename(args.dataset),
+                   "accuracy_bar": args.accuracy_bar},
+        "recommended": recommended,
+        "results": results,
+    }
+    with open(args.out, "w") as fh:
+        json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()